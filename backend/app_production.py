@@ -1,14 +1,25 @@
 import os
+import atexit
 import datetime
 import json
 import csv
 import io
+import threading
+import time
+import uuid
+import concurrent.futures
 from flask import Flask, request, jsonify, send_file
 from flask_cors import CORS
 from flask_bcrypt import Bcrypt
 import gspread
 from google.oauth2.service_account import Credentials
 from functools import wraps
+from snapshot import Snapshot, read_snapshot, write_atomic, write_snapshot
+from partitions import group_by_month, load_manifest, parse_expense_date, read_partition, write_partitions
+from search_index import SearchIndex
+from reconcile import SOURCES, reconcile
+from sheets_guard import GuardedWorksheet, SheetsBreaker, TokenBucket
+from reports import REPORT_FORMATS, build_sections, financial_year_months, month_range, parse_month, render_report
 
 # Setup Flask App for Production
 app = Flask(__name__)
@@ -39,31 +50,219 @@ users_db = {
 
 # Local storage file for expenses
 LOCAL_EXPENSES_FILE = 'expenses_backup.json'
+# Binary snapshot of the ledger; this is the primary local store and the
+# JSON file above is a human-readable export written from it
+LOCAL_SNAPSHOT_FILE = 'expenses_backup.bin'
+# One snapshot per year-month plus a manifest of counts and totals
+LOCAL_PARTITION_DIR = 'expenses_partitions'
+# Seconds to wait after a change before refreshing the JSON export, so a
+# burst of edits costs one export instead of one per edit
+JSON_EXPORT_DELAY = 60
+
+# Held for every read-modify-write of the local ledger
+ledger_lock = threading.RLock()
+json_export_timer = None
+
+# Inverted index over expense reasons, synced from the month partitions
+search_index = SearchIndex()
+# Most search results returned by default (the most recent ones)
+SEARCH_LIMIT = 200
 
 # --- Local Storage Functions ---
+class LocalStorageError(Exception):
+    """The local ledger exists but cannot be read (and must not be overwritten)"""
+
+def unreadable(path, error):
+    print(f"Error reading {path}: {error}")
+    return LocalStorageError(
+        f"Local expense file {path} is unreadable ({error}). "
+        "Restore it from a backup; it has not been modified."
+    )
+
 def load_local_expenses():
-    """Load expenses from local JSON file"""
-    try:
-        if os.path.exists(LOCAL_EXPENSES_FILE):
-            with open(LOCAL_EXPENSES_FILE, 'r') as f:
-                return json.load(f)
+    """
+    Load expenses from the binary snapshot. The JSON export is imported
+    only when there is no snapshot at all (first run after upgrading): it
+    can lag behind the snapshot, so it never replaces an unreadable one.
+    """
+    if os.path.exists(LOCAL_SNAPSHOT_FILE):
+        try:
+            return read_snapshot(LOCAL_SNAPSHOT_FILE)
+        except Exception as e:
+            raise unreadable(LOCAL_SNAPSHOT_FILE, e) from e
+
+    if not os.path.exists(LOCAL_EXPENSES_FILE):
         return []
+    try:
+        with open(LOCAL_EXPENSES_FILE, 'r') as f:
+            expenses = json.load(f)
     except Exception as e:
-        print(f"Error loading local expenses: {e}")
-        return []
+        raise unreadable(LOCAL_EXPENSES_FILE, e) from e
+
+    with ledger_lock:
+        if os.path.exists(LOCAL_SNAPSHOT_FILE):
+            # Another request imported it meanwhile
+            return load_local_expenses()
+        try:
+            write_snapshot(LOCAL_SNAPSHOT_FILE, expenses)
+            write_partitions(LOCAL_PARTITION_DIR, expenses)
+        except Exception as e:
+            print(f"Error importing {LOCAL_EXPENSES_FILE} into the snapshot: {e}")
+    return expenses
 
-def save_local_expenses(expenses):
-    """Save expenses to local JSON file"""
+def count_local_expenses():
+    """Number of stored expenses, read from the snapshot header when possible"""
+    if os.path.exists(LOCAL_SNAPSHOT_FILE):
+        try:
+            with Snapshot(LOCAL_SNAPSHOT_FILE) as snapshot:
+                return len(snapshot)
+        except Exception as e:
+            raise unreadable(LOCAL_SNAPSHOT_FILE, e) from e
+    return len(load_local_expenses())
+
+def save_local_expenses(expenses, months=None):
+    """
+    Save expenses to the binary snapshot and the month partitions, and
+    schedule a refresh of the JSON export. Pass the changed month keys to
+    rewrite only those partitions.
+    """
     try:
-        with open(LOCAL_EXPENSES_FILE, 'w') as f:
-            json.dump(expenses, f, indent=2)
+        with ledger_lock:
+            write_snapshot(LOCAL_SNAPSHOT_FILE, expenses)
+            write_partitions(LOCAL_PARTITION_DIR, expenses, months)
+        schedule_json_export()
         return True
     except Exception as e:
         print(f"Error saving local expenses: {e}")
         return False
 
+def export_local_json():
+    """Write the JSON export of the local ledger (for humans and external tools)"""
+    global json_export_timer
+    with ledger_lock:
+        json_export_timer = None
+        expenses = load_local_expenses()
+        write_atomic(LOCAL_EXPENSES_FILE, [json.dumps(expenses, indent=2).encode('utf-8')])
+    return expenses
+
+def schedule_json_export():
+    """Refresh the JSON export JSON_EXPORT_DELAY seconds from now, unless already pending"""
+    global json_export_timer
+    with ledger_lock:
+        if json_export_timer is None:
+            json_export_timer = threading.Timer(JSON_EXPORT_DELAY, export_pending_json)
+            json_export_timer.daemon = True
+            json_export_timer.start()
+
+@atexit.register
+def export_pending_json():
+    """Flush a pending JSON export (timer callback and at interpreter exit)"""
+    # export_local_json may clear the global at any moment: read it once
+    with ledger_lock:
+        timer = json_export_timer
+    if timer is None:
+        return
+    timer.cancel()
+    try:
+        export_local_json()
+    except Exception as e:
+        print(f"Error exporting local expenses to JSON: {e}")
+
+def load_month_summaries():
+    """Per-month counts and totals from the partition manifest"""
+    manifest = load_manifest(LOCAL_PARTITION_DIR)
+    if manifest is None:
+        # Partitions not built yet: build them now
+        expenses = load_local_expenses()
+        with ledger_lock:
+            write_partitions(LOCAL_PARTITION_DIR, expenses)
+        manifest = load_manifest(LOCAL_PARTITION_DIR) or {}
+    return manifest
+
+def load_month_expenses(year, month):
+    """Expenses for one month, read from that month's partition only"""
+    load_month_summaries()
+    return read_partition(LOCAL_PARTITION_DIR, year, month)
+
+def load_unparseable_expenses():
+    """Local expenses whose date cannot be parsed (no month partition holds them)"""
+    def unparseable(date):
+        try:
+            parse_expense_date(date)
+            return False
+        except (AttributeError, TypeError, ValueError):
+            return True
+
+    if not os.path.exists(LOCAL_SNAPSHOT_FILE):
+        return [e for e in load_local_expenses() if unparseable(e.get('date'))]
+    try:
+        with Snapshot(LOCAL_SNAPSHOT_FILE) as snapshot:
+            # Dates repeat a lot: check each distinct one once, and only
+            # decode whole rows when some are bad
+            bad = {date for date in set(snapshot.column('date')) if unparseable(date)}
+            return [e for e in snapshot.rows() if e['date'] in bad] if bad else []
+    except Exception as e:
+        raise unreadable(LOCAL_SNAPSHOT_FILE, e) from e
+
+def get_search_index():
+    """Search index for the local ledger, re-indexing only months whose partition changed"""
+    search_index.sync(
+        load_month_summaries(),
+        lambda year, month: read_partition(LOCAL_PARTITION_DIR, year, month)
+    )
+    return search_index
+
+def parse_search_limit(args):
+    """Read the optional limit query parameter (positive integer)"""
+    limit = int(args.get('limit', SEARCH_LIMIT))
+    if limit < 1:
+        raise ValueError('limit must be at least 1')
+    return limit
+
+def parse_date_filters(args):
+    """Read optional from/to (YYYY-MM-DD) query parameters"""
+    start = args.get('from')
+    end = args.get('to')
+    return (
+        datetime.date.fromisoformat(start) if start else None,
+        datetime.date.fromisoformat(end) if end else None
+    )
+
+def filter_by_date(expenses, start=None, end=None):
+    """Keep expenses dated within [start, end] (both inclusive, either optional)"""
+    if start is None and end is None:
+        return expenses
+    filtered = []
+    for expense in expenses:
+        try:
+            expense_date = parse_expense_date(expense['date']).date()
+        except (KeyError, TypeError, ValueError):
+            continue
+        if (start is None or expense_date >= start) and (end is None or expense_date <= end):
+            filtered.append(expense)
+    return filtered
+
 # --- Google Sheets Setup ---
-def get_google_sheet():
+# Seconds to wait for a single Sheets HTTP request
+SHEETS_TIMEOUT = 10
+
+# All Sheets calls go through this breaker; while it is open, routes use
+# local storage straight away. Sheets allows 60 requests/minute per user.
+sheets_breaker = SheetsBreaker(
+    failure_threshold=3,
+    base_cooldown=5,
+    max_cooldown=300,
+    rate_limiter=TokenBucket(rate=1, capacity=10)
+)
+# The worksheet handle is reused instead of reopening the spreadsheet
+# (two Sheets requests) for every API call. gspread keeps its row count
+# in step with this process's own appends and deletes.
+SHEET_HANDLE_TTL = 3600
+sheet_handle = None
+sheet_handle_opened = 0
+sheet_handle_lock = threading.Lock()
+
+def open_google_sheet(rate_limit_wait=None):
     """Connect to Google Sheets using service account credentials."""
     try:
         if os.path.exists('service_account.json'):
@@ -73,16 +272,158 @@ def get_google_sheet():
             ]
             creds = Credentials.from_service_account_file('service_account.json', scopes=scope)
             client = gspread.authorize(creds)
+            client.set_timeout(SHEETS_TIMEOUT)
         else:
             print("Warning: No service account found. Using local storage only.")
             return None
             
-        sheet = client.open_by_key(SHEET_ID).sheet1
-        return sheet
+        # open_by_key and sheet1 are one Sheets request each
+        spreadsheet = sheets_breaker.call_waiting(rate_limit_wait, client.open_by_key, SHEET_ID)
+        return sheets_breaker.call_waiting(rate_limit_wait, lambda: spreadsheet.sheet1)
     except Exception as e:
         print(f"Error connecting to Google Sheets: {e}")
         return None
 
+def get_google_sheet(rate_limit_wait=None):
+    """
+    Worksheet behind the circuit breaker, or None to use local storage.
+    Calls fail fast when the rate limit is used up unless rate_limit_wait
+    (seconds) is given; only background jobs should wait.
+    """
+    global sheet_handle, sheet_handle_opened
+    if sheets_breaker.is_open():
+        print("Google Sheets circuit open, using local storage")
+        return None
+    
+    with sheet_handle_lock:
+        if sheet_handle is None or time.monotonic() - sheet_handle_opened > SHEET_HANDLE_TTL:
+            sheet_handle = open_google_sheet(rate_limit_wait)
+            sheet_handle_opened = time.monotonic()
+        sheet = sheet_handle
+    
+    if sheet is None:
+        return None
+    return GuardedWorksheet(sheet, sheets_breaker, rate_limit_wait)
+
+# --- Reconciliation ---
+# Status of the background reconciliation started via /api/reconcile
+reconcile_status = {'running': False, 'started': None, 'finished': None, 'report': None, 'error': None}
+reconcile_lock = threading.Lock()
+# Reconciliation runs in the background, so it may wait for rate limit tokens
+RECONCILE_RATE_LIMIT_WAIT = 30
+
+def run_reconciliation(apply=False, source='local'):
+    """Compare local storage with the Google Sheet month by month (see reconcile.py)"""
+    sheet = get_google_sheet(rate_limit_wait=RECONCILE_RATE_LIMIT_WAIT)
+    if not sheet:
+        raise RuntimeError('Google Sheets not available')
+    # The diff runs unlocked; reconcile re-checks both sides before
+    # applying and holds ledger_lock only for the local write
+    return reconcile(
+        sheet,
+        load_month_summaries(),
+        load_month_expenses,
+        apply=apply,
+        source=source,
+        load_all=load_local_expenses,
+        save_all=save_local_expenses,
+        lock=ledger_lock,
+        local_unparseable=load_unparseable_expenses()
+    )
+
+def reconcile_in_background(apply, source):
+    """Thread target recording the outcome in reconcile_status"""
+    try:
+        report = run_reconciliation(apply=apply, source=source)
+        reconcile_status.update(report=report, error=None)
+    except Exception as e:
+        print(f"Error reconciling with Google Sheets: {e}")
+        reconcile_status.update(report=None, error=str(e))
+    finally:
+        reconcile_status.update(running=False, finished=datetime.datetime.now().isoformat())
+
+# --- Reports ---
+# Upper bound for a report built while the client waits on the download
+REPORT_TIMEOUT = 60
+# Background jobs have no client waiting on the connection, so they get
+# far longer; the cap only stops a stuck job from running forever
+REPORT_JOB_TIMEOUT = 600
+# Background report jobs started via /api/reports (oldest dropped first)
+report_jobs = {}
+report_jobs_lock = threading.Lock()
+MAX_REPORT_JOBS = 10
+
+def parse_report_request(params):
+    """
+    Months, format, title and filename for a report request. Takes either
+    financial_year (April to March) or from/to months (YYYY-MM).
+    """
+    fmt = params.get('format', 'xlsx')
+    if fmt not in REPORT_FORMATS:
+        raise ValueError(f"format must be one of: {', '.join(REPORT_FORMATS)}")
+    
+    if params.get('financial_year'):
+        year = int(params['financial_year'])
+        label = f"{year}-{(year + 1) % 100:02d}"
+        months = financial_year_months(year)
+        title = f"Legal Success India - Financial Year {label} Expense Report"
+        filename = f"Legal_Success_India_FY_{label}_Expenses.{fmt}"
+    else:
+        start = parse_month(params.get('from'))
+        end = parse_month(params.get('to') or params.get('from'))
+        months = month_range(start, end)
+        first, last = (f"{y}-{m:02d}" for y, m in (months[0], months[-1]))
+        title = f"Legal Success India - Expense Report - {first} to {last}"
+        filename = f"Legal_Success_India_{first}_to_{last}_Expenses.{fmt}"
+    return months, fmt, title, filename
+
+def generate_report(months, fmt, title, progress=None, timeout=REPORT_TIMEOUT):
+    """Build the month sections in parallel and render them as one file"""
+    # Build missing partitions once here rather than from every worker thread
+    load_month_summaries()
+    sections = build_sections(
+        months,
+        lambda year, month: read_partition(LOCAL_PARTITION_DIR, year, month),
+        progress=progress,
+        timeout=timeout
+    )
+    return render_report(sections, fmt, title)
+
+def report_in_background(job_id, months, fmt, title):
+    """Thread target recording progress and the finished file in report_jobs"""
+    job = report_jobs[job_id]
+    
+    def progress(done, total):
+        job['completed'] = done
+    
+    try:
+        job['data'] = generate_report(months, fmt, title, progress, timeout=REPORT_JOB_TIMEOUT)
+        job['status'] = 'done'
+    except Exception as e:
+        print(f"Error generating report: {e}")
+        job['status'] = 'failed'
+        job['error'] = str(e) or 'Report generation timed out'
+    finally:
+        job['finished'] = datetime.datetime.now().isoformat()
+
+def send_report(data, fmt, filename):
+    return send_file(io.BytesIO(data), mimetype=REPORT_FORMATS[fmt], as_attachment=True, download_name=filename)
+
+def report_response(params):
+    """Build a report within REPORT_TIMEOUT and send it as a download"""
+    try:
+        months, fmt, title, filename = parse_report_request(params)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        return send_report(generate_report(months, fmt, title), fmt, filename)
+    except concurrent.futures.TimeoutError:
+        return jsonify({'error': f"Report took longer than {REPORT_TIMEOUT}s, use /api/reports instead"}), 504
+    except Exception as e:
+        print(f"Error generating report: {e}")
+        return jsonify({'error': str(e)}), 500
+
 # --- Auth Middleware ---
 def token_required(f):
     @wraps(f)
@@ -92,6 +433,11 @@ def token_required(f):
 
 # --- Routes ---
 
+@app.errorhandler(LocalStorageError)
+def local_storage_error(e):
+    """Refuse to serve (or save over) a ledger that cannot be read"""
+    return jsonify({'error': str(e)}), 503
+
 @app.route('/api/login', methods=['POST'])
 def login():
     """Handle user login"""
@@ -112,6 +458,26 @@ def login():
 @app.route('/api/expenses', methods=['GET'])
 def get_expenses():
     """Fetch all expenses"""
+    try:
+        start, end = parse_date_filters(request.args)
+    except ValueError:
+        return jsonify({'error': 'from/to must be dates in YYYY-MM-DD format'}), 400
+    
+    # Reason search is always served from the local index, so results
+    # carry local ids even while the unfiltered list comes from the sheet
+    query = request.args.get('q', '').strip()
+    if query:
+        try:
+            limit = parse_search_limit(request.args)
+        except ValueError:
+            return jsonify({'error': 'limit must be a positive integer'}), 400
+        try:
+            results = get_search_index().search(query, limit=limit, start=start, end=end)
+            return jsonify(results), 200
+        except Exception as e:
+            print(f"Error searching expenses: {e}")
+            return jsonify({'error': str(e)}), 500
+    
     try:
         sheet = get_google_sheet()
         if sheet:
@@ -125,15 +491,15 @@ def get_expenses():
                     'reason': row.get('Reason', ''),
                     'timestamp': row.get('Timestamp', '')
                 })
-            return jsonify(formatted), 200
+            return jsonify(filter_by_date(formatted, start, end)), 200
         else:
             expenses = load_local_expenses()
-            return jsonify(expenses), 200
+            return jsonify(filter_by_date(expenses, start, end)), 200
             
     except Exception as e:
         print(f"Error fetching expenses: {e}")
         expenses = load_local_expenses()
-        return jsonify(expenses), 200
+        return jsonify(filter_by_date(expenses, start, end)), 200
 
 @app.route('/api/add-expense', methods=['POST'])
 def add_expense():
@@ -141,7 +507,7 @@ def add_expense():
     data = request.get_json()
     
     expense = {
-        'id': str(len(load_local_expenses())),
+        'id': str(count_local_expenses()),
         'date': data['date'],
         'amount': float(data['amount']),
         'reason': data['reason'],
@@ -157,17 +523,23 @@ def add_expense():
             row_data = [expense['date'], expense['amount'], expense['reason'], expense['timestamp']]
             sheet.append_row(row_data)
         
-        expenses = load_local_expenses()
-        expenses.append(expense)
-        save_local_expenses(expenses)
+        with ledger_lock:
+            expenses = load_local_expenses()
+            expenses.append(expense)
+            saved = save_local_expenses(expenses, group_by_month([expense]))
         
+        if not saved:
+            # The snapshot is the only local copy, so this is a failure
+            return jsonify({'error': 'Failed to save expense locally'}), 500
         return jsonify({'message': 'Expense added successfully', 'data': expense}), 201
         
     except Exception as e:
         print(f"Error adding expense: {e}")
-        expenses = load_local_expenses()
-        expenses.append(expense)
-        if save_local_expenses(expenses):
+        with ledger_lock:
+            expenses = load_local_expenses()
+            expenses.append(expense)
+            saved = save_local_expenses(expenses, group_by_month([expense]))
+        if saved:
             return jsonify({'message': 'Expense saved locally', 'data': expense}), 201
         else:
             return jsonify({'error': 'Failed to save expense'}), 500
@@ -176,9 +548,11 @@ def add_expense():
 def delete_expense(id):
     """Delete an expense"""
     try:
-        expenses = load_local_expenses()
-        expenses = [exp for exp in expenses if exp['id'] != id]
-        save_local_expenses(expenses)
+        with ledger_lock:
+            expenses = load_local_expenses()
+            removed = [exp for exp in expenses if exp['id'] == id]
+            expenses = [exp for exp in expenses if exp['id'] != id]
+            save_local_expenses(expenses, group_by_month(removed))
         
         sheet = get_google_sheet()
         if sheet:
@@ -198,7 +572,11 @@ def delete_expense(id):
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
-    return jsonify({'status': 'healthy', 'message': 'Legal Success India Expense Tracker API'}), 200
+    return jsonify({
+        'status': 'healthy',
+        'message': 'Legal Success India Expense Tracker API',
+        'google_sheets': sheets_breaker.state()
+    }), 200
 
 @app.route('/api/download/all', methods=['GET'])
 def download_all_expenses():
@@ -228,17 +606,27 @@ def download_all_expenses():
         print(f"Error generating CSV: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/download/json', methods=['GET'])
+def download_json_export():
+    """Download the local ledger as JSON (also refreshes expenses_backup.json)"""
+    try:
+        export_local_json()
+        return send_file(
+            os.path.abspath(LOCAL_EXPENSES_FILE),
+            mimetype='application/json',
+            as_attachment=True,
+            download_name=f"Legal_Success_India_Expenses_{datetime.datetime.now().strftime('%Y%m%d')}.json"
+        )
+    except Exception as e:
+        print(f"Error exporting JSON: {e}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/download/monthly/<year>/<month>', methods=['GET'])
 def download_monthly_expenses(year, month):
     """Download monthly expenses as CSV"""
     try:
-        expenses = load_local_expenses()
-        
-        monthly_expenses = []
-        for expense in expenses:
-            expense_date = datetime.datetime.fromisoformat(expense['date'].replace('Z', '+00:00'))
-            if expense_date.year == int(year) and expense_date.month == int(month):
-                monthly_expenses.append(expense)
+        # Only this month's partition is read
+        monthly_expenses = load_month_expenses(int(year), int(month))
         
         output = io.StringIO()
         writer = csv.writer(output)
@@ -278,29 +666,19 @@ def download_monthly_expenses(year, month):
 def get_available_months():
     """Get list of months that have expenses"""
     try:
-        expenses = load_local_expenses()
-        months = set()
-        
-        for expense in expenses:
-            expense_date = datetime.datetime.fromisoformat(expense['date'].replace('Z', '+00:00'))
-            month_key = f"{expense_date.year}-{expense_date.month:02d}"
-            month_name = expense_date.strftime('%B %Y')
-            months.add((month_key, month_name, expense_date.year, expense_date.month))
-        
-        sorted_months = sorted(months, key=lambda x: (x[2], x[3]), reverse=True)
+        summaries = load_month_summaries()
         
         result = []
-        for month_key, month_name, year, month in sorted_months:
-            month_expenses = [e for e in expenses if datetime.datetime.fromisoformat(e['date'].replace('Z', '+00:00')).year == year and datetime.datetime.fromisoformat(e['date'].replace('Z', '+00:00')).month == month]
-            total_amount = sum(e['amount'] for e in month_expenses)
-            
+        # Sort by date (newest first)
+        for month_key in sorted(summaries, reverse=True):
+            year, month = (int(part) for part in month_key.split('-'))
             result.append({
                 'key': month_key,
-                'name': month_name,
+                'name': datetime.datetime(year, month, 1).strftime('%B %Y'),
                 'year': year,
                 'month': month,
-                'count': len(month_expenses),
-                'total': total_amount
+                'count': summaries[month_key]['count'],
+                'total': summaries[month_key]['total']
             })
         
         return jsonify(result), 200
@@ -309,6 +687,83 @@ def get_available_months():
         print(f"Error getting months: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/reconcile', methods=['GET'])
+def get_reconcile_status():
+    """Status and last report of the background reconciliation"""
+    return jsonify(reconcile_status), 200
+
+@app.route('/api/reconcile', methods=['POST'])
+def start_reconcile():
+    """Start reconciling local storage with Google Sheets in the background"""
+    data = request.get_json(silent=True) or {}
+    apply = bool(data.get('apply', False))
+    source = data.get('source', 'local')
+    if source not in SOURCES:
+        return jsonify({'error': f"source must be one of: {', '.join(SOURCES)}"}), 400
+    
+    with reconcile_lock:
+        if reconcile_status['running']:
+            return jsonify({'message': 'Reconciliation already running'}), 409
+        reconcile_status.update(running=True, started=datetime.datetime.now().isoformat(), finished=None)
+    
+    threading.Thread(target=reconcile_in_background, args=(apply, source), daemon=True).start()
+    return jsonify({'message': 'Reconciliation started', 'mode': 'apply' if apply else 'dry-run', 'source': source}), 202
+
+@app.route('/api/download/report', methods=['GET'])
+def download_report():
+    """Download a multi-month report (from/to as YYYY-MM) as XLSX or Parquet"""
+    return report_response(request.args)
+
+@app.route('/api/download/financial-year/<year>', methods=['GET'])
+def download_financial_year(year):
+    """Download the April-March financial year report starting in <year>"""
+    return report_response({'financial_year': year, 'format': request.args.get('format', 'xlsx')})
+
+@app.route('/api/reports', methods=['POST'])
+def start_report():
+    """Start building a report in the background; poll /api/reports/<job_id> for progress"""
+    try:
+        months, fmt, title, filename = parse_report_request(request.get_json(silent=True) or {})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    job_id = uuid.uuid4().hex
+    with report_jobs_lock:
+        while len(report_jobs) >= MAX_REPORT_JOBS:
+            report_jobs.pop(next(iter(report_jobs)))
+        report_jobs[job_id] = {
+            'status': 'running',
+            'completed': 0,
+            'total': len(months),
+            'format': fmt,
+            'filename': filename,
+            'started': datetime.datetime.now().isoformat(),
+            'finished': None,
+            'error': None,
+            'data': None
+        }
+    
+    threading.Thread(target=report_in_background, args=(job_id, months, fmt, title), daemon=True).start()
+    return jsonify({'message': 'Report started', 'job_id': job_id, 'total': len(months)}), 202
+
+@app.route('/api/reports/<job_id>', methods=['GET'])
+def get_report_status(job_id):
+    """Progress of a background report (months completed out of total)"""
+    job = report_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Report not found'}), 404
+    return jsonify({key: value for key, value in job.items() if key != 'data'}), 200
+
+@app.route('/api/reports/<job_id>/download', methods=['GET'])
+def download_report_job(job_id):
+    """Download the file of a finished background report"""
+    job = report_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Report not found'}), 404
+    if job['status'] != 'done':
+        return jsonify({'error': f"Report is {job['status']}", 'completed': job['completed'], 'total': job['total']}), 409
+    return send_report(job['data'], job['format'], job['filename'])
+
 if __name__ == '__main__':
     print("Starting Legal Success India Expense Tracker API (Production)...")
     print("CORS enabled for production domains")
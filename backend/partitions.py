@@ -0,0 +1,200 @@
+"""
+Month-partitioned copy of the local expense ledger.
+
+Each year-month gets its own snapshot file (YYYY-MM.bin) inside the
+partition directory, next to a small manifest.json holding per-month
+counts, totals and content hashes. Month reports read only their own
+partition and the month list is served from the manifest alone.
+
+Months before the current one are closed: their partition files are
+made read-only and flagged in the manifest. Partitions are cached
+in-process under their manifest content hash, so a closed month is read
+from disk once and then served from memory for as long as the process
+lives; an open month is re-read only after its content changes.
+"""
+import datetime
+import hashlib
+import json
+import os
+import stat
+
+from snapshot import read_snapshot, write_atomic, write_snapshot
+
+MANIFEST_FILE = 'manifest.json'
+
+# path -> (content hash, expenses)
+_partition_cache = {}
+# directory -> (mtime_ns, manifest)
+_manifest_cache = {}
+
+
+def parse_expense_date(value):
+    """Parse an expense date the way the routes do (ISO, optional trailing Z)"""
+    return datetime.datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+
+def month_key(value):
+    """'YYYY-MM' partition key for an expense date string"""
+    expense_date = parse_expense_date(value)
+    return f"{expense_date.year}-{expense_date.month:02d}"
+
+
+def expense_digest(expense):
+    """Content hash of one expense, independent of its id and storage"""
+    fields = (
+        str(expense.get('date', '')).strip(),
+        f"{float(expense.get('amount') or 0):.2f}",
+        str(expense.get('reason', '')).strip(),
+        str(expense.get('timestamp', '')).strip()
+    )
+    return hashlib.sha256('\x1f'.join(fields).encode('utf-8')).hexdigest()
+
+
+def month_digest(expenses):
+    """Order-independent content hash of a month's expenses"""
+    digest = hashlib.sha256()
+    for row_digest in sorted(expense_digest(e) for e in expenses):
+        digest.update(row_digest.encode('ascii'))
+    return digest.hexdigest()
+
+
+def group_by_month(expenses):
+    """Group expenses by partition key, keeping their original order"""
+    groups = {}
+    for expense in expenses:
+        try:
+            key = month_key(expense['date'])
+        except (KeyError, TypeError, ValueError) as e:
+            print(f"Skipping expense with invalid date in partitioning: {e}")
+            continue
+        groups.setdefault(key, []).append(expense)
+    return groups
+
+
+def partition_path(directory, key):
+    return os.path.join(directory, f"{key}.bin")
+
+
+def load_manifest(directory):
+    """Read the partition manifest, or None if it has not been built yet"""
+    path = os.path.join(directory, MANIFEST_FILE)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+    cached = _manifest_cache.get(directory)
+    if cached and cached[0] == mtime:
+        return cached[1]
+
+    with open(path, 'r') as f:
+        manifest = json.load(f)
+    _manifest_cache[directory] = (mtime, manifest)
+    return manifest
+
+
+def _save_manifest(directory, manifest):
+    path = os.path.join(directory, MANIFEST_FILE)
+    write_atomic(path, [json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8')])
+
+
+def _make_writable(path):
+    # Closed partitions are read-only; Windows refuses to replace those
+    if os.path.exists(path):
+        os.chmod(path, stat.S_IREAD | stat.S_IWRITE | stat.S_IRGRP | stat.S_IROTH)
+
+
+def _close_months(directory, manifest):
+    """Make partitions of months before the current one read-only"""
+    current_key = datetime.date.today().strftime('%Y-%m')
+    for key, entry in manifest.items():
+        if key < current_key and not entry.get('closed'):
+            path = partition_path(directory, key)
+            if os.path.exists(path):
+                os.chmod(path, stat.S_IREAD | stat.S_IRGRP | stat.S_IROTH)
+            manifest[key] = dict(entry, closed=True)
+
+
+def _in_months(expense, keys):
+    """Cheap pre-filter: ISO dates start with their YYYY-MM partition key"""
+    prefix = str(expense.get('date', ''))[:7]
+    # Anything not shaped like YYYY-MM is left for group_by_month to judge
+    return prefix in keys or len(prefix) != 7 or prefix[4] != '-'
+
+
+def write_partitions(directory, expenses, months=None):
+    """
+    Write month partitions and the manifest for the given ledger.
+    When months is given only those partitions are rewritten (and only
+    the expenses in those months are parsed); otherwise the whole
+    directory is rebuilt and stale partitions are removed.
+    """
+    os.makedirs(directory, exist_ok=True)
+
+    manifest = load_manifest(directory) if months is not None else None
+    if manifest is None:
+        manifest = {}
+        months = None
+    else:
+        manifest = dict(manifest)
+
+    if months is None:
+        groups = group_by_month(expenses)
+        keys = set(groups)
+    else:
+        keys = set(months)
+        groups = group_by_month([e for e in expenses if _in_months(e, keys)])
+
+    for key in keys:
+        month_expenses = groups.get(key, [])
+        path = partition_path(directory, key)
+        _make_writable(path)
+        if month_expenses:
+            write_snapshot(path, month_expenses)
+            manifest[key] = {
+                'count': len(month_expenses),
+                'total': sum(e['amount'] for e in month_expenses),
+                'hash': month_digest(month_expenses)
+            }
+        else:
+            if os.path.exists(path):
+                os.remove(path)
+            manifest.pop(key, None)
+        _partition_cache.pop(path, None)
+
+    if months is None:
+        for name in os.listdir(directory):
+            if name.endswith('.bin') and name[:-4] not in manifest:
+                _make_writable(os.path.join(directory, name))
+                os.remove(os.path.join(directory, name))
+
+    _close_months(directory, manifest)
+    _save_manifest(directory, manifest)
+
+
+def read_partition(directory, year, month):
+    """Expenses for a single month, read from its partition only"""
+    key = f"{year}-{month:02d}"
+    path = partition_path(directory, key)
+
+    manifest = load_manifest(directory)
+    if manifest is not None and key not in manifest:
+        return []
+    # Old manifests have no hash; fall back to the file's mtime
+    version = manifest[key].get('hash') if manifest is not None else None
+    if version is None:
+        try:
+            version = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return []
+
+    cached = _partition_cache.get(path)
+    if cached and cached[0] == version:
+        return list(cached[1])
+
+    try:
+        expenses = read_snapshot(path)
+    except FileNotFoundError:
+        return []
+    _partition_cache[path] = (version, expenses)
+    return list(expenses)
@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+"""
+Reconcile the local expense backup with the Google Sheet.
+
+Both sides are reduced to a two-level hash tree: one content hash per
+month (see partitions.month_digest) and a root hash over all months. The
+local month hashes come straight from the partition manifest; the sheet
+is read once and hashed the same way. Only months whose hashes differ
+are loaded from local storage and diffed row by row.
+
+Differences are reported, and in apply mode repaired using one side as
+the source of truth:
+    local  append rows missing from the sheet, delete extra sheet rows
+    sheet  add rows missing locally, remove extra local rows
+
+Rows whose date cannot be parsed belong to no month, on either side.
+They are reported under "unparseable" (sheet rows) and
+"unparseable_local" (local expenses), keep in_sync false, and are never
+repaired automatically, since there is no telling which month they were
+meant for.
+
+The diff is built without holding any lock. Just before applying, both
+sides are read again and only differences that still hold are repaired;
+a sheet row is deleted only if its row number still holds the expense
+that was diffed. Anything that changed in between is skipped and
+reported. The lock passed in guards only the local read-modify-write.
+Extra sheet rows are deleted in one batch request.
+
+Usage:
+    python reconcile.py                 # dry run, exit code 1 if out of sync
+    python reconcile.py --apply         # make the sheet match local storage
+    python reconcile.py --apply --source sheet
+"""
+import argparse
+import hashlib
+import json
+import sys
+from collections import Counter
+from contextlib import nullcontext
+
+from partitions import expense_digest, month_digest, month_key
+
+SHEET_HEADER = ['Date', 'Amount', 'Reason', 'Timestamp']
+SOURCES = ('local', 'sheet')
+
+
+def root_digest(month_digests):
+    """Root of the hash tree: a hash over every (month, month hash) pair"""
+    digest = hashlib.sha256()
+    for key in sorted(month_digests):
+        digest.update(f"{key}:{month_digests[key]}\n".encode('ascii'))
+    return digest.hexdigest()
+
+
+def read_sheet_expenses(sheet):
+    """
+    All sheet rows as expense dicts, each tagged with its sheet row number.
+    Returns (expenses, has_header).
+    """
+    values = sheet.get_all_values(value_render_option='UNFORMATTED_VALUE')
+    has_header = bool(values) and values[0][:1] == SHEET_HEADER[:1]
+    expenses = []
+    for row_number, row in enumerate(values, start=1):
+        if row_number == 1 and has_header:
+            continue
+        expense = row_expense(row, row_number)
+        if expense is not None:
+            expenses.append(expense)
+    return expenses, has_header
+
+
+def row_expense(row, row_number):
+    """Expense dict for one sheet row, or None for a blank row"""
+    row = list(row) + [''] * (len(SHEET_HEADER) - len(row))
+    if not any(str(value).strip() for value in row):
+        return None
+    try:
+        amount = float(row[1]) if row[1] != '' else 0
+    except ValueError:
+        amount = 0
+    return {
+        'date': str(row[0]),
+        'amount': amount,
+        'reason': str(row[2]),
+        'timestamp': str(row[3]),
+        'row': row_number
+    }
+
+
+def group_sheet_rows(sheet_expenses):
+    """Sheet rows grouped by month, plus the rows whose date cannot be parsed"""
+    months = {}
+    unparseable = []
+    for expense in sheet_expenses:
+        try:
+            key = month_key(expense['date'])
+        except ValueError:
+            unparseable.append(expense)
+            continue
+        months.setdefault(key, []).append(expense)
+    return months, unparseable
+
+
+def local_month_digests(month_summaries, load_month):
+    """Month hashes for local storage, computed for old manifests without one"""
+    digests = {}
+    for key, summary in month_summaries.items():
+        digest = summary.get('hash')
+        if digest is None:
+            year, month = (int(part) for part in key.split('-'))
+            digest = month_digest(load_month(year, month))
+        digests[key] = digest
+    return digests
+
+
+def diff_month(local_expenses, sheet_expenses):
+    """Rows present on only one side (duplicates are counted, not collapsed)"""
+    local_counts = Counter(expense_digest(e) for e in local_expenses)
+    sheet_counts = Counter(expense_digest(e) for e in sheet_expenses)
+    local_only = local_counts - sheet_counts
+    sheet_only = sheet_counts - local_counts
+
+    missing_in_sheet = []
+    for expense in local_expenses:
+        digest = expense_digest(expense)
+        if local_only[digest]:
+            local_only[digest] -= 1
+            missing_in_sheet.append(expense)
+
+    missing_locally = []
+    for expense in sheet_expenses:
+        digest = expense_digest(expense)
+        if sheet_only[digest]:
+            sheet_only[digest] -= 1
+            missing_locally.append(expense)
+
+    return missing_in_sheet, missing_locally
+
+
+def reconcile(sheet, month_summaries, load_month, apply=False, source='local',
+              load_all=None, save_all=None, lock=None, local_unparseable=()):
+    """
+    Compare local storage with the sheet and optionally repair it.
+
+    month_summaries is the partition manifest, load_month(year, month)
+    reads one local partition, and load_all/save_all(expenses, months)
+    are required to apply with source='sheet'. lock, if given, is held
+    only while local storage is read and rewritten. local_unparseable
+    lists the local expenses whose date cannot be parsed (the partitions
+    leave them out).
+    """
+    if source not in SOURCES:
+        raise ValueError(f"source must be one of {', '.join(SOURCES)}")
+
+    sheet_expenses, has_header = read_sheet_expenses(sheet)
+    sheet_months, unparseable = group_sheet_rows(sheet_expenses)
+    sheet_digests = {key: month_digest(rows) for key, rows in sheet_months.items()}
+    local_digests = local_month_digests(month_summaries, load_month)
+
+    local_root = root_digest(local_digests)
+    sheet_root = root_digest(sheet_digests)
+    report = {
+        'mode': 'apply' if apply else 'dry-run',
+        'source': source,
+        'in_sync': local_root == sheet_root and not unparseable and not local_unparseable,
+        'local_root': local_root,
+        'sheet_root': sheet_root,
+        'months_checked': len(set(local_digests) | set(sheet_digests)),
+        'months_differing': [],
+        'differences': {},
+        # Not part of any month and never repaired automatically
+        'unparseable': unparseable,
+        'unparseable_local': list(local_unparseable)
+    }
+    if local_root == sheet_root:
+        return report
+
+    for key in sorted(set(local_digests) | set(sheet_digests)):
+        if local_digests.get(key) == sheet_digests.get(key):
+            continue
+        year, month = (int(part) for part in key.split('-'))
+        local_rows = load_month(year, month) if key in local_digests else []
+        missing_in_sheet, missing_locally = diff_month(local_rows, sheet_months.get(key, []))
+        report['months_differing'].append(key)
+        report['differences'][key] = {
+            'missing_in_sheet': missing_in_sheet,
+            'missing_locally': missing_locally
+        }
+
+    if apply:
+        if source == 'sheet' and (load_all is None or save_all is None):
+            raise ValueError("load_all and save_all are required to apply with source='sheet'")
+        # Either side may have changed while the diff was built: read the
+        # sheet again so only differences that still hold are repaired
+        sheet_expenses, has_header = read_sheet_expenses(sheet)
+        sheet_months, _ = group_sheet_rows(sheet_expenses)
+        if source == 'local':
+            local_months = {}
+            for key in report['differences']:
+                year, month = (int(part) for part in key.split('-'))
+                local_months[key] = load_month(year, month)
+            # A header is only added to a completely empty sheet
+            needs_header = not has_header and not sheet_expenses
+            report['applied'] = _apply_to_sheet(sheet, report['differences'], local_months, sheet_months, needs_header)
+        else:
+            with lock or nullcontext():
+                report['applied'] = _apply_to_local(report['differences'], sheet_months, load_all, save_all)
+    return report
+
+
+def _recheck(differences, local_months, sheet_months, match_rows=False):
+    """
+    The differences that still hold in a fresh read of both sides, plus
+    the rows that no longer differ. With match_rows a sheet row also
+    counts as changed once its row number holds something else.
+    """
+    current = {}
+    skipped = []
+    for key, diff in differences.items():
+        local_rows = local_months.get(key, [])
+        sheet_rows = sheet_months.get(key, [])
+        local_counts = Counter(expense_digest(e) for e in local_rows)
+        sheet_counts = Counter(expense_digest(e) for e in sheet_rows)
+        local_only = local_counts - sheet_counts
+        sheet_only = sheet_counts - local_counts
+        row_digests = {e['row']: expense_digest(e) for e in sheet_rows}
+
+        missing_in_sheet = []
+        for expense in diff['missing_in_sheet']:
+            digest = expense_digest(expense)
+            if local_only[digest]:
+                local_only[digest] -= 1
+                missing_in_sheet.append(expense)
+            else:
+                skipped.append(expense)
+
+        missing_locally = []
+        for expense in diff['missing_locally']:
+            digest = expense_digest(expense)
+            if sheet_only[digest] and (not match_rows or row_digests.get(expense['row']) == digest):
+                sheet_only[digest] -= 1
+                missing_locally.append(expense)
+            else:
+                skipped.append(expense)
+
+        current[key] = {'missing_in_sheet': missing_in_sheet, 'missing_locally': missing_locally}
+    return current, skipped
+
+
+def delete_sheet_rows(sheet, rows):
+    """Delete sheet rows (1-based) in a single batch request"""
+    ranges = []
+    # Bottom-up so earlier deletes do not shift the remaining row numbers;
+    # adjacent rows are merged into one range
+    for row in sorted(set(rows), reverse=True):
+        if ranges and ranges[-1][0] == row:
+            ranges[-1][0] = row - 1
+        else:
+            ranges.append([row - 1, row])
+    if not ranges:
+        return
+    sheet.spreadsheet.batch_update({'requests': [
+        {'deleteDimension': {'range': {
+            'sheetId': sheet.id,
+            'dimension': 'ROWS',
+            'startIndex': start,
+            'endIndex': end
+        }}}
+        for start, end in ranges
+    ]})
+
+
+def _apply_to_sheet(sheet, differences, local_months, sheet_months, needs_header):
+    """Make the sheet match local storage"""
+    # Rows are deleted by number, so the number must still hold the
+    # expense that was diffed
+    differences, skipped = _recheck(differences, local_months, sheet_months, match_rows=True)
+
+    extra_rows = [expense['row'] for diff in differences.values() for expense in diff['missing_locally']]
+    delete_sheet_rows(sheet, extra_rows)
+
+    missing = [
+        [expense['date'], expense['amount'], expense['reason'], expense['timestamp']]
+        for diff in differences.values() for expense in diff['missing_in_sheet']
+    ]
+    if missing:
+        sheet.append_rows([SHEET_HEADER] + missing if needs_header else missing)
+
+    return {'deleted_from_sheet': len(extra_rows), 'appended_to_sheet': len(missing), 'skipped_changed_rows': skipped}
+
+
+def _apply_to_local(differences, sheet_months, load_all, save_all):
+    """Make local storage match the sheet"""
+    expenses = load_all()
+    local_months = {}
+    for expense in expenses:
+        try:
+            local_months.setdefault(month_key(expense['date']), []).append(expense)
+        except ValueError:
+            continue
+    differences, skipped = _recheck(differences, local_months, sheet_months)
+
+    remove = Counter(
+        expense_digest(expense)
+        for diff in differences.values() for expense in diff['missing_in_sheet']
+    )
+    kept = []
+    for expense in expenses:
+        digest = expense_digest(expense)
+        if remove[digest]:
+            remove[digest] -= 1
+            continue
+        kept.append(expense)
+    removed = len(expenses) - len(kept)
+
+    added = 0
+    next_id = max((int(e['id']) for e in kept if str(e.get('id', '')).isdigit()), default=-1) + 1
+    for diff in differences.values():
+        for expense in diff['missing_locally']:
+            kept.append({
+                'id': str(next_id),
+                'date': expense['date'],
+                'amount': expense['amount'],
+                'reason': expense['reason'],
+                'timestamp': expense['timestamp']
+            })
+            next_id += 1
+            added += 1
+
+    if not save_all(kept, list(differences)):
+        raise RuntimeError('Failed to save local expenses')
+    return {'removed_locally': removed, 'added_locally': added, 'skipped_changed_rows': skipped}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Reconcile local expenses with Google Sheets')
+    parser.add_argument('--apply', action='store_true', help='repair differences instead of only reporting them')
+    parser.add_argument('--source', choices=SOURCES, default='local', help='side treated as correct when applying (default: local)')
+    args = parser.parse_args(argv)
+
+    # Imported here so the app module can import this one for its routes
+    from app import run_reconciliation
+
+    report = run_reconciliation(apply=args.apply, source=args.source)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    return 0 if report['in_sync'] or args.apply else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,185 @@
+"""
+Multi-month and financial year expense reports.
+
+Each month of the range becomes a section (its expenses plus a summary),
+built in parallel on a thread pool from that month's partition. The
+sections are then assembled into one multi-sheet XLSX workbook (a
+summary sheet plus one sheet per month) or a single Parquet table.
+
+Parquet output needs pyarrow, which is optional; XLSX needs openpyxl.
+Text typed in by users (reasons, dates) is always written to XLSX as a
+string cell, so a reason like '=HYPERLINK(...)' cannot become a formula.
+"""
+import datetime
+import io
+import json
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+
+REPORT_FORMATS = {
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'parquet': 'application/vnd.apache.parquet'
+}
+
+# Three financial years is plenty for an audit and keeps requests bounded
+MAX_REPORT_MONTHS = 36
+MAX_WORKERS = 8
+
+EXPENSE_HEADER = ['Date', 'Amount (₹)', 'Reason', 'Timestamp']
+
+# Leading characters spreadsheet apps may treat as the start of a formula
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def parse_month(value):
+    """(year, month) from a 'YYYY-MM' string"""
+    try:
+        year, month = (int(part) for part in value.split('-'))
+    except (AttributeError, ValueError):
+        raise ValueError(f"Invalid month '{value}', expected YYYY-MM")
+    if not 1 <= month <= 12:
+        raise ValueError(f"Invalid month '{value}', expected YYYY-MM")
+    return year, month
+
+
+def month_range(start, end):
+    """Every (year, month) from start to end inclusive"""
+    first = start[0] * 12 + start[1] - 1
+    last = end[0] * 12 + end[1] - 1
+    if last < first:
+        raise ValueError('Report range must not end before it starts')
+    if last - first + 1 > MAX_REPORT_MONTHS:
+        raise ValueError(f"Reports are limited to {MAX_REPORT_MONTHS} months")
+    return [(index // 12, index % 12 + 1) for index in range(first, last + 1)]
+
+
+def financial_year_months(year):
+    """Months of the Indian financial year starting in April of `year`"""
+    return month_range((year, 4), (year + 1, 3))
+
+
+def build_month_section(year, month, expenses):
+    """One month of the report: its expenses and summary figures"""
+    total = sum(e['amount'] for e in expenses)
+    return {
+        'key': f"{year}-{month:02d}",
+        'name': datetime.datetime(year, month, 1).strftime('%B %Y'),
+        'expenses': expenses,
+        'count': len(expenses),
+        'total': total,
+        'average': round(total / len(expenses), 2) if expenses else 0
+    }
+
+
+def build_sections(months, load_month, progress=None, timeout=None):
+    """
+    Build month sections in parallel, returned in calendar order.
+    progress(done, total) is called as each month finishes; raises
+    concurrent.futures.TimeoutError if the whole build exceeds timeout.
+    """
+    def build(year, month):
+        return build_month_section(year, month, load_month(year, month))
+
+    sections = {}
+    pool = ThreadPoolExecutor(max_workers=max(1, min(MAX_WORKERS, len(months))))
+    try:
+        futures = {pool.submit(build, year, month): (year, month) for year, month in months}
+        for done, future in enumerate(as_completed(futures, timeout=timeout), start=1):
+            sections[futures[future]] = future.result()
+            if progress:
+                progress(done, len(months))
+    finally:
+        # Do not wait for stragglers after a timeout or failure
+        pool.shutdown(wait=False, cancel_futures=True)
+    return [sections[month] for month in months]
+
+
+def _text_cell(sheet, value):
+    """User text as an explicit string cell when it could pass for a formula"""
+    if not isinstance(value, str) or not value.startswith(FORMULA_PREFIXES):
+        return value
+    cell = WriteOnlyCell(sheet, value=value)
+    # openpyxl infers data_type 'f' for anything starting with '='
+    cell.data_type = 's'
+    return cell
+
+
+def render_xlsx(sections, title):
+    """Workbook with a summary sheet followed by one sheet per month"""
+    workbook = Workbook(write_only=True)
+
+    summary = workbook.create_sheet('Summary')
+    summary.append([title])
+    summary.append([])
+    summary.append(['Month', 'Total Transactions', 'Total Amount (₹)', 'Average per Transaction (₹)'])
+    for section in sections:
+        summary.append([section['name'], section['count'], section['total'], section['average']])
+    count = sum(section['count'] for section in sections)
+    total = sum(section['total'] for section in sections)
+    summary.append([])
+    summary.append(['Total', count, total, round(total / count, 2) if count else 0])
+
+    for section in sections:
+        sheet = workbook.create_sheet(section['name'])
+        sheet.append([f"Legal Success India - Monthly Expense Report - {section['name']}"])
+        sheet.append([])
+        sheet.append(EXPENSE_HEADER)
+        for expense in section['expenses']:
+            sheet.append([
+                _text_cell(sheet, expense['date']),
+                expense['amount'],
+                _text_cell(sheet, expense['reason']),
+                _text_cell(sheet, expense['timestamp'])
+            ])
+        sheet.append([])
+        sheet.append(['Summary'])
+        sheet.append(['Total Transactions', section['count']])
+        sheet.append(['Total Amount (₹)', section['total']])
+        sheet.append(['Average per Transaction (₹)', section['average']])
+
+    output = io.BytesIO()
+    workbook.save(output)
+    return output.getvalue()
+
+
+def render_parquet(sections, title):
+    """Single Parquet table of all expenses; month summaries go in the file metadata"""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError('Parquet export requires pyarrow (pip install pyarrow)')
+
+    columns = {'month': [], 'id': [], 'date': [], 'amount': [], 'reason': [], 'timestamp': []}
+    for section in sections:
+        for expense in section['expenses']:
+            columns['month'].append(section['key'])
+            columns['id'].append(str(expense.get('id', '')))
+            columns['date'].append(expense['date'])
+            columns['amount'].append(float(expense['amount']))
+            columns['reason'].append(expense['reason'])
+            columns['timestamp'].append(expense['timestamp'])
+
+    summaries = [
+        {key: section[key] for key in ('key', 'name', 'count', 'total', 'average')}
+        for section in sections
+    ]
+    schema = pa.schema(
+        [(name, pa.float64() if name == 'amount' else pa.string()) for name in columns],
+        metadata={'title': title, 'summary': json.dumps(summaries, ensure_ascii=False)}
+    )
+    table = pa.table(columns, schema=schema)
+
+    output = io.BytesIO()
+    pq.write_table(table, output)
+    return output.getvalue()
+
+
+def render_report(sections, fmt, title):
+    if fmt == 'xlsx':
+        return render_xlsx(sections, title)
+    if fmt == 'parquet':
+        return render_parquet(sections, title)
+    raise ValueError(f"format must be one of: {', '.join(REPORT_FORMATS)}")
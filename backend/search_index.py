@@ -0,0 +1,199 @@
+"""
+In-memory inverted index over expense reasons.
+
+Reasons are NFKC-normalised and case folded, then split into word tokens
+(Devanagari and the other Indic blocks are kept whole, including their
+vowel signs). Query terms of MIN_PREFIX_LENGTH characters or more match
+as a prefix, so 'cour' finds 'court' and 'स्टा' finds 'स्टाम्प'; shorter
+terms only match whole tokens, so a one-letter query cannot fan out over
+most of the vocabulary. All terms must match.
+
+The index mirrors the month partitions: each month has its own postings
+(token -> positions in that month's partition) and sync() re-indexes
+only months whose manifest hash changed, so an add or delete costs one
+month, not the whole ledger. A search walks the months newest first and
+stops once it has `limit` matches, so common words stay cheap however
+large the ledger grows. Expenses without a valid date have no partition
+and are not searchable.
+"""
+import bisect
+import gc
+import re
+import threading
+import unicodedata
+
+from partitions import parse_expense_date
+
+# Letters/digits plus the Indic script blocks (U+0900-U+0DFF), which
+# carry combining vowel signs that \w does not match
+TOKEN_PATTERN = re.compile(r'(?:[^\W_]|[\u0900-\u0DFF])+')
+
+MIN_PREFIX_LENGTH = 3
+
+
+def tokenize(text):
+    """Case-folded word tokens of a piece of text"""
+    if not text:
+        return []
+    text = str(text)
+    # NFKC leaves ASCII unchanged, and casefold() equals lower() there
+    if text.isascii():
+        return TOKEN_PATTERN.findall(text.lower())
+    return TOKEN_PATTERN.findall(unicodedata.normalize('NFKC', text).casefold())
+
+
+class SearchIndex:
+    """Inverted index mapping reason tokens to expenses, one set of postings per month"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        self._months = {}        # month key -> (version, postings, expenses)
+        self._token_months = {}  # token -> number of months using it
+        self._vocabulary = []    # sorted tokens, for prefix lookups
+        self._sorted = True      # False when _vocabulary needs rebuilding
+        self._token_cache = {}   # reason -> distinct tokens
+
+    def __len__(self):
+        return sum(len(expenses) for _, _, expenses in self._months.values())
+
+    def _tokens(self, reason):
+        tokens = self._token_cache.get(reason)
+        if tokens is None:
+            tokens = self._token_cache[reason] = tuple(set(tokenize(reason)))
+        return tokens
+
+    def sync(self, manifest, load_month):
+        """
+        Bring the index in line with the partition manifest, re-indexing
+        only months whose hash changed. load_month(year, month) reads
+        one partition.
+        """
+        with self._lock:
+            for key in [key for key in self._months if key not in manifest]:
+                self._drop_month(key)
+            # The build allocates millions of long-lived sets and lists; the
+            # cyclic GC would rescan all of them over and over for nothing
+            gc_enabled = gc.isenabled()
+            gc.disable()
+            try:
+                for key, entry in manifest.items():
+                    version = entry.get('hash') or (entry.get('count'), entry.get('total'))
+                    if key not in self._months or self._months[key][0] != version:
+                        self._drop_month(key)
+                        self._add_month(key, version, load_month(int(key[:4]), int(key[5:7])))
+            finally:
+                if gc_enabled:
+                    gc.enable()
+            if not self._sorted:
+                self._vocabulary = sorted(self._token_months)
+                self._sorted = True
+
+    def _add_month(self, key, version, expenses):
+        # Group by reason first: reasons repeat a lot (court fee, stamp
+        # paper...) and each distinct one is then tokenized only once
+        by_reason = {}
+        for position, expense in enumerate(expenses):
+            by_reason.setdefault(expense.get('reason'), []).append(position)
+
+        postings = {}
+        for reason, positions in by_reason.items():
+            for token in self._tokens(reason):
+                if token in postings:
+                    postings[token].update(positions)
+                else:
+                    postings[token] = set(positions)
+
+        for token in postings:
+            count = self._token_months.get(token, 0)
+            if not count:
+                self._sorted = False
+            self._token_months[token] = count + 1
+        self._months[key] = (version, postings, expenses)
+
+    def _drop_month(self, key):
+        if key not in self._months:
+            return
+        _, postings, _ = self._months.pop(key)
+        for token in postings:
+            self._token_months[token] -= 1
+            if not self._token_months[token]:
+                del self._token_months[token]
+                self._sorted = False
+
+    def _expand(self, term):
+        """Vocabulary tokens a query term matches"""
+        if len(term) < MIN_PREFIX_LENGTH:
+            return [term] if term in self._token_months else []
+        start = bisect.bisect_left(self._vocabulary, term)
+        end = start
+        while end < len(self._vocabulary) and self._vocabulary[end].startswith(term):
+            end += 1
+        return self._vocabulary[start:end]
+
+    @staticmethod
+    def _month_positions(postings, expansions):
+        """Positions in one month matching every term, or an empty set"""
+        sets = []
+        for tokens in expansions:
+            if len(tokens) == 1:
+                docs = postings.get(tokens[0])
+            else:
+                docs = set()
+                for token in tokens:
+                    if token in postings:
+                        docs |= postings[token]
+            if not docs:
+                return set()
+            sets.append(docs)
+        # Intersect starting from the rarest term to keep sets small
+        sets.sort(key=len)
+        return sets[0].intersection(*sets[1:])
+
+    @staticmethod
+    def _in_range(expense, start, end):
+        """Exact date check, needed only in the first and last month of a range"""
+        date = parse_expense_date(expense['date']).date()
+        return (start is None or date >= start) and (end is None or date <= end)
+
+    def search(self, query, limit=None, start=None, end=None):
+        """
+        Expenses whose reason matches every term of query, dated within
+        [start, end] (datetime.date, both optional), in ledger order.
+        With a limit only the most recent `limit` matches are returned.
+        """
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+
+        first_key = start.strftime('%Y-%m') if start else None
+        last_key = end.strftime('%Y-%m') if end else None
+
+        with self._lock:
+            expansions = [self._expand(term) for term in terms]
+            if not all(expansions):
+                return []
+
+            months = []
+            found = 0
+            for key in sorted(self._months, reverse=True):
+                if (last_key and key > last_key) or (first_key and key < first_key):
+                    continue
+                _, postings, expenses = self._months[key]
+                positions = self._month_positions(postings, expansions)
+                if not positions:
+                    continue
+                matches = [expenses[position] for position in sorted(positions)]
+                if key in (first_key, last_key):
+                    matches = [e for e in matches if self._in_range(e, start, end)]
+                months.append(matches)
+                found += len(matches)
+                if limit is not None and found >= limit:
+                    break
+
+        results = [expense for matches in reversed(months) for expense in matches]
+        if limit is not None:
+            results = results[-limit:]
+        return results
@@ -0,0 +1,214 @@
+"""
+Circuit breaker and client-side rate limiting for Google Sheets calls.
+
+Every Sheets request goes through SheetsBreaker.call(). After a run of
+failures (timeouts, connection errors, 5xx) or a single 429 the breaker
+opens and callers fail fast, so routes fall back to local storage
+without waiting on the network. The breaker stays open for an
+exponentially growing, jittered cooldown, then lets a single half-open
+probe through: success closes it, failure reopens it for longer.
+
+A token bucket keeps this process under the Sheets quota (60 requests
+per minute per user by default). When it is empty, request handlers fail
+fast (and fall back to local storage) instead of sleeping; background
+jobs such as reconciliation ask for a wait with call_waiting().
+"""
+import random
+import threading
+import time
+
+import requests
+from gspread.exceptions import APIError
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling Sheets while the breaker is open"""
+
+
+class RateLimitedError(Exception):
+    """Raised when the client-side Sheets quota is exhausted"""
+
+
+class TokenBucket:
+    """Token bucket allowing `rate` calls per second with bursts of `capacity`"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, timeout=0):
+        """Take one token, waiting up to timeout seconds. Returns False if none came"""
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate
+            if now + wait > deadline:
+                return False
+            time.sleep(wait)
+
+    @property
+    def tokens(self):
+        with self._lock:
+            self._refill(time.monotonic())
+            return self._tokens
+
+
+def _status_code(error):
+    if isinstance(error, APIError):
+        return getattr(error.response, 'status_code', None)
+    return None
+
+
+def is_outage(error):
+    """True for errors that mean Sheets is unavailable rather than the request being wrong"""
+    status = _status_code(error)
+    if status is not None:
+        return status in (408, 429) or status >= 500
+    return isinstance(error, (requests.exceptions.RequestException, OSError, TimeoutError))
+
+
+class SheetsBreaker:
+    """Circuit breaker with exponential, jittered cooldowns and a half-open probe"""
+
+    def __init__(self, failure_threshold=3, base_cooldown=5, max_cooldown=300,
+                 rate_limiter=None, rate_limit_wait=0):
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = base_cooldown
+        self.max_cooldown = max_cooldown
+        self.rate_limiter = rate_limiter
+        self.rate_limit_wait = rate_limit_wait
+
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._trips = 0
+        self._open_until = 0
+        self._probe_in_flight = False
+        self._last_error = None
+
+    def is_open(self):
+        """True while calls would be rejected without touching the network"""
+        with self._lock:
+            if self._state == OPEN:
+                return time.monotonic() < self._open_until
+            return self._state == HALF_OPEN and self._probe_in_flight
+
+    def _before_call(self):
+        with self._lock:
+            if self._state == OPEN:
+                if time.monotonic() < self._open_until:
+                    raise CircuitOpenError('Google Sheets circuit is open')
+                self._state = HALF_OPEN
+            if self._state == HALF_OPEN:
+                if self._probe_in_flight:
+                    raise CircuitOpenError('Google Sheets circuit is half-open, probe in progress')
+                self._probe_in_flight = True
+
+    def _on_success(self):
+        with self._lock:
+            self._state = CLOSED
+            self._failures = 0
+            self._trips = 0
+            self._probe_in_flight = False
+
+    def _on_failure(self, error):
+        with self._lock:
+            self._failures += 1
+            self._last_error = str(error) or error.__class__.__name__
+            self._probe_in_flight = False
+            trip = (
+                self._state == HALF_OPEN
+                or self._failures >= self.failure_threshold
+                or _status_code(error) == 429
+            )
+            if trip:
+                self._trips += 1
+                cooldown = min(self.max_cooldown, self.base_cooldown * 2 ** (self._trips - 1))
+                # Equal jitter: somewhere between half and all of the cooldown
+                cooldown = cooldown / 2 + random.uniform(0, cooldown / 2)
+                self._state = OPEN
+                self._open_until = time.monotonic() + cooldown
+                print(f"Google Sheets circuit opened for {cooldown:.1f}s: {self._last_error}")
+
+    def call(self, func, *args, **kwargs):
+        """Run one Sheets request through the breaker and rate limiter"""
+        return self.call_waiting(None, func, *args, **kwargs)
+
+    def call_waiting(self, rate_limit_wait, func, *args, **kwargs):
+        """
+        call(), waiting up to rate_limit_wait seconds for a rate limit
+        token (None for the breaker's default)
+        """
+        if rate_limit_wait is None:
+            rate_limit_wait = self.rate_limit_wait
+        self._before_call()
+        if self.rate_limiter and not self.rate_limiter.acquire(rate_limit_wait):
+            with self._lock:
+                self._probe_in_flight = False
+            raise RateLimitedError('Google Sheets client-side quota exhausted')
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            if is_outage(e):
+                self._on_failure(e)
+            else:
+                # The API answered, so it is up; the request itself was bad
+                self._on_success()
+            raise
+        self._on_success()
+        return result
+
+    def state(self):
+        """Breaker state for the health endpoint"""
+        with self._lock:
+            state = self._state
+            retry_in = max(0, self._open_until - time.monotonic()) if state == OPEN else 0
+            status = {
+                'state': state,
+                'consecutive_failures': self._failures,
+                'retry_in_seconds': round(retry_in, 1),
+                'last_error': self._last_error
+            }
+        if self.rate_limiter:
+            status['rate_limit_tokens'] = round(self.rate_limiter.tokens, 1)
+        return status
+
+
+class GuardedWorksheet:
+    """
+    Worksheet proxy that sends every method call through a breaker, also
+    for its parent spreadsheet (used for batch updates).
+    rate_limit_wait overrides the breaker's wait for a rate limit token.
+    """
+
+    def __init__(self, worksheet, breaker, rate_limit_wait=None):
+        self._worksheet = worksheet
+        self._breaker = breaker
+        self._rate_limit_wait = rate_limit_wait
+
+    def __getattr__(self, name):
+        attr = getattr(self._worksheet, name)
+        if name == 'spreadsheet':
+            return GuardedWorksheet(attr, self._breaker, self._rate_limit_wait)
+        if not callable(attr):
+            return attr
+
+        def guarded(*args, **kwargs):
+            return self._breaker.call_waiting(self._rate_limit_wait, attr, *args, **kwargs)
+        return guarded
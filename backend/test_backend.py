@@ -0,0 +1,654 @@
+#!/usr/bin/env python3
+"""
+Focused checks for the backend storage, search, sync and report modules.
+Unlike test_api.py these need no running server: the app is exercised
+through Flask's test client against a temporary storage directory.
+
+Run with `python test_backend.py` or `python -m pytest test_backend.py`.
+"""
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import requests
+
+import app as expense_app
+import snapshot
+from openpyxl import load_workbook
+from reports import build_month_section, financial_year_months, render_xlsx
+from search_index import SearchIndex, tokenize
+from sheets_guard import CircuitOpenError, RateLimitedError, SheetsBreaker, TokenBucket
+from snapshot import Snapshot, read_snapshot, write_snapshot
+
+SAMPLE_EXPENSES = [
+    {'id': '0', 'date': '2025-04-05', 'amount': 100.0, 'reason': 'Court fee', 'timestamp': '2025-04-05T10:00:00'},
+    {'id': '1', 'date': '2025-04-19T00:00:00.000Z', 'amount': 250.5, 'reason': 'Stamp paper', 'timestamp': '2025-04-19T11:00:00'},
+    {'id': '2', 'date': '2026-03-15', 'amount': 2500.0, 'reason': 'कोर्ट फ़ीस', 'timestamp': '2026-03-15T12:00:00'},
+]
+
+
+# temp_app() replaces get_google_sheet; the Sheets tests need the real one
+open_sheet = expense_app.get_google_sheet
+
+
+@contextmanager
+def patched(obj, **attrs):
+    saved = {name: getattr(obj, name) for name in attrs}
+    for name, value in attrs.items():
+        setattr(obj, name, value)
+    try:
+        yield obj
+    finally:
+        for name, value in saved.items():
+            setattr(obj, name, value)
+
+
+@contextmanager
+def temp_dir():
+    directory = tempfile.mkdtemp()
+    try:
+        yield directory
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+@contextmanager
+def temp_app():
+    """The Flask app with all local storage pointed at a fresh directory"""
+    with temp_dir() as directory:
+        saved = {
+            name: getattr(expense_app, name)
+            for name in ('LOCAL_EXPENSES_FILE', 'LOCAL_SNAPSHOT_FILE', 'LOCAL_PARTITION_DIR', 'get_google_sheet')
+        }
+        expense_app.LOCAL_EXPENSES_FILE = os.path.join(directory, 'expenses_backup.json')
+        expense_app.LOCAL_SNAPSHOT_FILE = os.path.join(directory, 'expenses_backup.bin')
+        expense_app.LOCAL_PARTITION_DIR = os.path.join(directory, 'expenses_partitions')
+        expense_app.get_google_sheet = lambda *args, **kwargs: None
+        expense_app.search_index.clear()
+        try:
+            yield expense_app, expense_app.app.test_client()
+        finally:
+            if expense_app.json_export_timer is not None:
+                expense_app.json_export_timer.cancel()
+                expense_app.json_export_timer = None
+            for name, value in saved.items():
+                setattr(expense_app, name, value)
+            expense_app.search_index.clear()
+
+
+def add_expenses(client, expenses):
+    for expense in expenses:
+        response = client.post('/api/add-expense', json={
+            'date': expense['date'], 'amount': expense['amount'], 'reason': expense['reason']
+        })
+        assert response.status_code == 201, response.get_json()
+
+
+# --- Snapshot ---
+
+def test_snapshot_round_trip():
+    """Snapshot files read back exactly what was written"""
+    with temp_dir() as directory:
+        path = os.path.join(directory, 'ledger.bin')
+        write_snapshot(path, SAMPLE_EXPENSES)
+        assert read_snapshot(path) == SAMPLE_EXPENSES
+        with Snapshot(path) as snapshot:
+            assert len(snapshot) == 3
+            assert snapshot.column('reason') == [e['reason'] for e in SAMPLE_EXPENSES]
+            assert snapshot.column('amount') == [100.0, 250.5, 2500.0]
+
+        write_snapshot(path, [])
+        assert read_snapshot(path) == []
+
+        write_snapshot(path, [{'id': None, 'date': '', 'amount': None, 'reason': '', 'timestamp': ''}])
+        assert read_snapshot(path) == [{'id': '', 'date': '', 'amount': 0.0, 'reason': '', 'timestamp': ''}]
+
+
+def test_snapshot_concurrent_writers():
+    """Concurrent writers each produce a complete file and leave no temp files"""
+    with temp_dir() as directory:
+        path = os.path.join(directory, 'ledger.bin')
+        ledgers = [SAMPLE_EXPENSES[:n] for n in range(1, 4)] * 5
+        threads = [threading.Thread(target=write_snapshot, args=(path, ledger)) for ledger in ledgers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert read_snapshot(path) in [SAMPLE_EXPENSES[:n] for n in range(1, 4)]
+        assert os.listdir(directory) == ['ledger.bin']
+
+
+def test_snapshot_replace_retries_while_file_is_open():
+    """On Windows a replace blocked by an open reader is retried, not lost"""
+    failures = []
+    real_replace = os.replace
+
+    def replace(source, target):
+        if len(failures) < 2:
+            failures.append(target)
+            raise PermissionError('file is in use')
+        real_replace(source, target)
+
+    with temp_dir() as directory:
+        path = os.path.join(directory, 'ledger.bin')
+        with patched(snapshot, RETRY_REPLACE=True, REPLACE_RETRY_DELAY=0), patched(snapshot.os, replace=replace):
+            write_snapshot(path, SAMPLE_EXPENSES)
+        assert len(failures) == 2
+        assert read_snapshot(path) == SAMPLE_EXPENSES
+        assert os.listdir(directory) == ['ledger.bin']
+
+
+def test_add_expense_reports_failed_save():
+    """A failed local save returns an error, not a 201"""
+    with temp_app() as (app, client):
+        with patched(app, save_local_expenses=lambda *args, **kwargs: False):
+            response = client.post('/api/add-expense', json={'date': '2026-03-21', 'amount': 1, 'reason': 'Tea'})
+        assert response.status_code == 500
+
+
+def test_json_import_and_export():
+    """A legacy JSON backup is imported once; the JSON export is refreshed on demand"""
+    with temp_app() as (app, client):
+        with open(app.LOCAL_EXPENSES_FILE, 'w') as f:
+            json.dump(SAMPLE_EXPENSES[:1], f)
+
+        assert client.get('/api/expenses').get_json() == SAMPLE_EXPENSES[:1]
+        assert os.path.exists(app.LOCAL_SNAPSHOT_FILE)
+
+        add_expenses(client, SAMPLE_EXPENSES[1:2])
+        with open(app.LOCAL_EXPENSES_FILE) as f:
+            assert len(json.load(f)) == 1  # export is deferred
+        assert app.json_export_timer is not None
+
+        response = client.get('/api/download/json')
+        assert response.status_code == 200
+        assert [e['reason'] for e in json.loads(response.data)] == ['Court fee', 'Stamp paper']
+        with open(app.LOCAL_EXPENSES_FILE) as f:
+            assert len(json.load(f)) == 2
+        response.close()
+
+
+def test_unreadable_snapshot_is_never_replaced():
+    """A damaged snapshot is reported, not silently rebuilt from the older JSON export"""
+    with temp_app() as (app, client):
+        add_expenses(client, SAMPLE_EXPENSES)
+        client.get('/api/download/json').close()
+        add_expenses(client, [{'date': '2026-03-20', 'amount': 5, 'reason': 'Xerox'}])
+        with open(app.LOCAL_SNAPSHOT_FILE, 'r+b') as f:
+            f.truncate(10)
+
+        response = client.get('/api/expenses')
+        assert response.status_code == 503
+        assert 'unreadable' in response.get_json()['error']
+        response = client.post('/api/add-expense', json={'date': '2026-03-21', 'amount': 1, 'reason': 'Tea'})
+        assert response.status_code == 503
+        assert os.path.getsize(app.LOCAL_SNAPSHOT_FILE) == 10
+        assert sum(entry['count'] for entry in app.load_month_summaries().values()) == 4
+
+
+# --- Month partitions ---
+
+def test_partition_manifest_after_add_and_delete():
+    """The manifest tracks per-month counts, totals and hashes through adds and deletes"""
+    with temp_app() as (app, client):
+        add_expenses(client, SAMPLE_EXPENSES)
+        manifest = app.load_month_summaries()
+        assert {key: (entry['count'], entry['total']) for key, entry in manifest.items()} == {
+            '2025-04': (2, 350.5), '2026-03': (1, 2500.0)
+        }
+        april_hash = manifest['2025-04']['hash']
+
+        client.delete('/api/expenses/1')
+        manifest = app.load_month_summaries()
+        assert (manifest['2025-04']['count'], manifest['2025-04']['total']) == (1, 100.0)
+        assert manifest['2025-04']['hash'] != april_hash
+        assert [e['reason'] for e in app.load_month_expenses(2025, 4)] == ['Court fee']
+
+        client.delete('/api/expenses/0')
+        assert '2025-04' not in app.load_month_summaries()
+        assert client.get('/api/months').get_json()[0]['key'] == '2026-03'
+
+
+def test_partition_write_touches_only_given_months():
+    """Incremental writes leave other partitions alone and close past months"""
+    with temp_app() as (app, client):
+        add_expenses(client, SAMPLE_EXPENSES)
+        other = os.path.join(app.LOCAL_PARTITION_DIR, '2026-03.bin')
+        before = os.stat(other).st_mtime_ns
+
+        add_expenses(client, [{'date': '2025-04-30', 'amount': 1, 'reason': 'Xerox'}])
+        assert os.stat(other).st_mtime_ns == before
+
+        manifest = app.load_month_summaries()
+        assert manifest['2025-04']['closed'] is True
+        april = os.path.join(app.LOCAL_PARTITION_DIR, '2025-04.bin')
+        assert not os.stat(april).st_mode & 0o222  # read-only
+        assert len(app.load_month_expenses(2025, 4)) == 3
+
+
+# --- Search ---
+
+def test_tokenize_devanagari():
+    """Indic tokens keep their vowel signs; Latin text is case folded"""
+    assert tokenize('कोर्ट फ़ीस') == ['कोर्ट', 'फ़ीस']
+    assert tokenize('Court-FEE, Stamp_paper') == ['court', 'fee', 'stamp', 'paper']
+
+
+def test_prefix_search_devanagari():
+    """Prefix search works in Hindi and English; short terms match whole words only"""
+    with temp_app() as (app, client):
+        add_expenses(client, SAMPLE_EXPENSES + [
+            {'date': '2026-03-20', 'amount': 50, 'reason': 'स्टाम्प पेपर'},
+            {'date': '2026-03-21', 'amount': 10, 'reason': 'Fee to clerk'},
+        ])
+
+        def search(query):
+            response = client.get('/api/expenses', query_string={'q': query})
+            assert response.status_code == 200
+            return [e['reason'] for e in response.get_json()]
+
+        assert search('कोर्ट') == ['कोर्ट फ़ीस']
+        assert search('स्टा') == ['स्टाम्प पेपर']
+        assert search('को') == []  # two characters: whole words only
+        assert search('cour') == ['Court fee']
+        assert search('fee') == ['Court fee', 'Fee to clerk']
+        assert search('to') == ['Fee to clerk']
+        assert search('fe') == []
+
+        response = client.get('/api/expenses', query_string={'q': 'fee', 'from': '2026-01-01'})
+        assert [e['reason'] for e in response.get_json()] == ['Fee to clerk']
+
+
+def test_search_limit_and_incremental_sync():
+    """Limits keep the most recent matches; only changed months are re-indexed"""
+    with temp_app() as (app, client):
+        add_expenses(client, SAMPLE_EXPENSES)
+        response = client.get('/api/expenses', query_string={'q': 'court', 'limit': 1})
+        assert [e['reason'] for e in response.get_json()] == ['Court fee']
+        assert client.get('/api/expenses', query_string={'q': 'court', 'limit': 0}).status_code == 400
+
+        add_expenses(client, [{'date': '2026-03-22', 'amount': 20, 'reason': 'Stamp vendor'}])
+        response = client.get('/api/expenses', query_string={'q': 'stamp', 'limit': 1})
+        assert [e['reason'] for e in response.get_json()] == ['Stamp vendor']
+
+        client.delete('/api/expenses/1')
+        results = client.get('/api/expenses', query_string={'q': 'stamp'}).get_json()
+        assert [(e['id'], e['reason']) for e in results] == [('3', 'Stamp vendor')]
+
+
+def test_search_index_sync_reloads_changed_months_only():
+    """sync() reloads months whose hash changed and drops months that are gone"""
+    loaded = []
+    months = {
+        (2025, 4): [{'id': '0', 'date': '2025-04-05', 'reason': 'Court fee'}],
+        (2025, 5): [{'id': '1', 'date': '2025-05-05', 'reason': 'Court fee'}],
+    }
+
+    def load_month(year, month):
+        loaded.append((year, month))
+        return months[(year, month)]
+
+    index = SearchIndex()
+    index.sync({'2025-04': {'hash': 'a'}, '2025-05': {'hash': 'b'}}, load_month)
+    assert len(index.search('court')) == 2
+
+    months[(2025, 5)] = [{'id': '1', 'date': '2025-05-05', 'reason': 'Typing'}]
+    loaded.clear()
+    index.sync({'2025-04': {'hash': 'a'}, '2025-05': {'hash': 'c'}}, load_month)
+    assert loaded == [(2025, 5)]
+    assert index.search('court') == months[(2025, 4)]
+    assert index.search('typ') == months[(2025, 5)]
+
+    index.sync({'2025-05': {'hash': 'c'}}, load_month)
+    assert index.search('court') == []
+    assert len(index) == 1
+
+
+# --- Reconciliation ---
+
+class FakeSheet:
+    """Just enough of a gspread worksheet for reconcile.py"""
+
+    id = 0
+
+    def __init__(self, rows):
+        self.rows = [list(row) for row in rows]
+        self.batch_updates = []
+
+    @property
+    def spreadsheet(self):
+        return self
+
+    def batch_update(self, body):
+        self.batch_updates.append(body)
+        for request in body['requests']:
+            span = request['deleteDimension']['range']
+            del self.rows[span['startIndex']:span['endIndex']]
+
+    @property
+    def row_count(self):
+        return len(self.rows)
+
+    def get_all_values(self, **kwargs):
+        return [list(row) for row in self.rows]
+
+    def row_values(self, row, **kwargs):
+        return list(self.rows[row - 1]) if row <= len(self.rows) else []
+
+    def delete_rows(self, row):
+        del self.rows[row - 1]
+
+    def append_row(self, row):
+        self.rows.append(list(row))
+
+    def append_rows(self, rows):
+        self.rows.extend(list(row) for row in rows)
+
+
+def sheet_row(expense):
+    return [expense['date'], expense['amount'], expense['reason'], expense['timestamp']]
+
+
+@contextmanager
+def reconcile_app(sheet_rows):
+    """temp_app with the three sample expenses stored locally and a fake sheet"""
+    with temp_app() as (app, client):
+        add_expenses(client, SAMPLE_EXPENSES)
+        local = app.load_local_expenses()
+        sheet = FakeSheet([['Date', 'Amount', 'Reason', 'Timestamp']] + sheet_rows(local))
+        app.get_google_sheet = lambda *args, **kwargs: sheet
+        yield app, local, sheet
+
+
+EXTRA_ROW = ['2025-04-10', 75, 'Notary', '2025-04-10T09:00:00']
+BAD_DATE_ROW = ['10/04/2025', 20, 'Xerox', '2025-04-10T09:30:00']
+
+
+def test_reconcile_dry_run():
+    """Differing months are diffed row by row; unparseable sheet rows are reported"""
+    with reconcile_app(lambda local: [sheet_row(local[0]), EXTRA_ROW, BAD_DATE_ROW]) as (app, local, sheet):
+        report = app.run_reconciliation()
+        assert not report['in_sync']
+        assert report['months_differing'] == ['2025-04', '2026-03']
+        april = report['differences']['2025-04']
+        assert [e['reason'] for e in april['missing_in_sheet']] == ['Stamp paper']
+        assert [(e['reason'], e['row']) for e in april['missing_locally']] == [('Notary', 3)]
+        assert [e['reason'] for e in report['differences']['2026-03']['missing_in_sheet']] == ['कोर्ट फ़ीस']
+        assert [(e['date'], e['row']) for e in report['unparseable']] == [('10/04/2025', 4)]
+        assert len(sheet.rows) == 4  # dry run changes nothing
+
+
+def test_reconcile_reports_unparseable_local_rows():
+    """Local expenses with a bad date are in no partition but still reported"""
+    with reconcile_app(lambda local: [sheet_row(e) for e in local]) as (app, local, sheet):
+        assert app.run_reconciliation()['in_sync']
+        client = app.app.test_client()
+        client.post('/api/add-expense', json={'date': 'bad-date', 'amount': 5, 'reason': 'Tea'})
+        report = app.run_reconciliation()
+        assert report['local_root'] == report['sheet_root']
+        assert not report['in_sync']
+        assert [e['reason'] for e in report['unparseable_local']] == ['Tea']
+
+
+def test_reconcile_apply_to_sheet():
+    """Apply with source=local repairs the sheet but leaves unparseable rows alone"""
+    with reconcile_app(lambda local: [sheet_row(local[0]), EXTRA_ROW, BAD_DATE_ROW]) as (app, local, sheet):
+        report = app.run_reconciliation(apply=True)
+        assert report['applied'] == {'deleted_from_sheet': 1, 'appended_to_sheet': 2, 'skipped_changed_rows': []}
+        assert [row[2] for row in sheet.rows[1:]] == ['Court fee', 'Xerox', 'Stamp paper', 'कोर्ट फ़ीस']
+        assert len(sheet.batch_updates) == 1
+
+        report = app.run_reconciliation()
+        assert report['local_root'] == report['sheet_root']
+        assert not report['in_sync'] and len(report['unparseable']) == 1
+
+
+def test_reconcile_skips_rows_changed_since_read():
+    """A sheet row edited between the read and the delete is not deleted"""
+    with reconcile_app(lambda local: [sheet_row(e) for e in local] + [EXTRA_ROW]) as (app, local, sheet):
+        read_values = sheet.get_all_values
+
+        def get_all_values(**kwargs):
+            values = read_values(**kwargs)
+            sheet.rows[4] = ['2025-04-10', 80, 'Notary (corrected)', '2025-04-10T09:00:00']
+            return values
+        sheet.get_all_values = get_all_values
+
+        report = app.run_reconciliation(apply=True)
+        assert report['applied']['deleted_from_sheet'] == 0
+        assert [e['row'] for e in report['applied']['skipped_changed_rows']] == [5]
+        assert sheet.rows[4][2] == 'Notary (corrected)'
+
+
+def test_reconcile_deletes_rows_in_one_batch():
+    """Extra rows are deleted bottom-up in one request, adjacent rows merged"""
+    notary = [EXTRA_ROW, ['2025-04-11', 10, 'Courier', '2025-04-11T09:00:00']]
+    with reconcile_app(lambda local: notary + [sheet_row(e) for e in local] + [EXTRA_ROW]) as (app, local, sheet):
+        report = app.run_reconciliation(apply=True)
+        assert report['applied']['deleted_from_sheet'] == 3
+        assert [row[2] for row in sheet.rows[1:]] == [e['reason'] for e in local]
+        [body] = sheet.batch_updates
+        assert [(r['deleteDimension']['range']['startIndex'], r['deleteDimension']['range']['endIndex'])
+                for r in body['requests']] == [(6, 7), (1, 3)]
+
+
+def test_reconcile_rechecks_and_does_not_hold_the_lock():
+    """Sheet reads run unlocked, and a row added meanwhile is not appended twice"""
+    with reconcile_app(lambda local: [sheet_row(e) for e in local[:2]]) as (app, local, sheet):
+        read_values = sheet.get_all_values
+        lock_free = []
+
+        def get_all_values(**kwargs):
+            values = read_values(**kwargs)
+            # Another thread must be able to save locally meanwhile
+            def acquire():
+                acquired = app.ledger_lock.acquire(timeout=1)
+                if acquired:
+                    app.ledger_lock.release()
+                lock_free.append(acquired)
+            thread = threading.Thread(target=acquire)
+            thread.start()
+            thread.join()
+            # add_expense appends to the sheet between the diff and the apply
+            if sheet_row(local[2]) not in sheet.rows:
+                sheet.rows.append(sheet_row(local[2]))
+            return values
+        sheet.get_all_values = get_all_values
+
+        report = app.run_reconciliation(apply=True)
+        assert lock_free and all(lock_free)
+        assert report['applied']['appended_to_sheet'] == 0
+        assert [e['reason'] for e in report['applied']['skipped_changed_rows']] == ['कोर्ट फ़ीस']
+        assert len(sheet.rows) == 4
+
+
+def test_reconcile_apply_to_local():
+    """Apply with source=sheet makes local storage match the sheet"""
+    with reconcile_app(lambda local: [sheet_row(local[0]), sheet_row(local[2]), EXTRA_ROW]) as (app, local, sheet):
+        report = app.run_reconciliation(apply=True, source='sheet')
+        assert report['applied'] == {'removed_locally': 1, 'added_locally': 1, 'skipped_changed_rows': []}
+        assert sorted(e['reason'] for e in app.load_local_expenses()) == ['Court fee', 'Notary', 'कोर्ट फ़ीस']
+        assert app.run_reconciliation()['in_sync']
+
+
+# --- Sheets circuit breaker ---
+
+def outage(*args):
+    raise requests.exceptions.ConnectionError('connection reset')
+
+
+def test_breaker_open_half_open_closed():
+    """Failures open the breaker; after the cooldown one probe closes it again"""
+    breaker = SheetsBreaker(failure_threshold=2, base_cooldown=0.05, max_cooldown=1)
+    for _ in range(2):
+        try:
+            breaker.call(outage)
+        except requests.exceptions.ConnectionError:
+            pass
+    assert breaker.state()['state'] == 'open'
+    assert breaker.is_open()
+    calls = []
+    try:
+        breaker.call(calls.append, 'not sent')
+        assert False, 'open breaker let a call through'
+    except CircuitOpenError:
+        pass
+    assert calls == []
+
+    time.sleep(0.06)
+    assert not breaker.is_open()
+
+    def probe():
+        # While the single probe is in flight other calls are rejected
+        assert breaker.state()['state'] == 'half_open'
+        try:
+            breaker.call(calls.append, 'not sent')
+            assert False, 'second call during the probe'
+        except CircuitOpenError:
+            pass
+        return 'ok'
+    assert breaker.call(probe) == 'ok'
+    assert breaker.state()['state'] == 'closed'
+    assert breaker.state()['consecutive_failures'] == 0
+    assert calls == []
+
+
+def test_breaker_failed_probe_reopens():
+    """A failing half-open probe opens the breaker again"""
+    breaker = SheetsBreaker(failure_threshold=1, base_cooldown=0.05, max_cooldown=1)
+    for delay in (0, 0.06):
+        time.sleep(delay)
+        try:
+            breaker.call(outage)
+        except requests.exceptions.ConnectionError:
+            pass
+        assert breaker.state()['state'] == 'open'
+
+
+def test_rate_limit_fails_fast_unless_asked_to_wait():
+    """An empty token bucket rejects at once; call_waiting() waits for a token"""
+    breaker = SheetsBreaker(rate_limiter=TokenBucket(rate=20, capacity=1))
+    assert breaker.call(lambda: 'first') == 'first'
+    started = time.monotonic()
+    try:
+        breaker.call(lambda: 'second')
+        assert False, 'empty bucket let a call through'
+    except RateLimitedError:
+        pass
+    assert time.monotonic() - started < 0.02
+    assert breaker.call_waiting(1, lambda: 'waited') == 'waited'
+    assert breaker.state()['state'] == 'closed'
+
+
+def test_worksheet_handle_is_cached():
+    """The spreadsheet is opened once (two requests, two tokens) and then reused"""
+    requests_made = []
+
+    class Spreadsheet:
+        @property
+        def sheet1(self):
+            requests_made.append('sheet1')
+            return FakeSheet([])
+
+    class Client:
+        def set_timeout(self, timeout):
+            pass
+
+        def open_by_key(self, key):
+            requests_made.append('open_by_key')
+            return Spreadsheet()
+
+    bucket = TokenBucket(rate=0.001, capacity=3)
+    breaker = SheetsBreaker(rate_limiter=bucket)
+    with temp_dir() as directory:
+        open(os.path.join(directory, 'service_account.json'), 'w').close()
+        cwd = os.getcwd()
+        os.chdir(directory)
+        try:
+            with patched(expense_app.Credentials, from_service_account_file=lambda *args, **kwargs: None), \
+                    patched(expense_app.gspread, authorize=lambda creds: Client()), \
+                    patched(expense_app, sheets_breaker=breaker, sheet_handle=None):
+                first = open_sheet()
+                second = open_sheet()
+                assert first is not None and second is not None
+                assert requests_made == ['open_by_key', 'sheet1']
+                assert round(bucket.tokens) == 1
+
+                first.append_row(['2026-03-01', 1, 'Xerox', 't'])
+                assert second.row_count == 1
+                # Bucket now empty: the request fails fast instead of sleeping
+                try:
+                    second.append_row(['2026-03-01', 1, 'Xerox', 't'])
+                    assert False, 'empty bucket let a call through'
+                except RateLimitedError:
+                    pass
+        finally:
+            os.chdir(cwd)
+
+
+# --- Reports ---
+
+def test_financial_year_months():
+    """An Indian financial year runs from April to March"""
+    months = financial_year_months(2025)
+    assert len(months) == 12
+    assert months[0] == (2025, 4) and months[8] == (2025, 12)
+    assert months[9] == (2026, 1) and months[-1] == (2026, 3)
+
+
+def test_financial_year_report():
+    """The FY workbook has a summary sheet and one sheet per month, April first"""
+    with temp_app() as (app, client):
+        add_expenses(client, SAMPLE_EXPENSES + [{'date': '2025-03-31', 'amount': 5, 'reason': 'Previous year'}])
+        response = client.get('/api/download/financial-year/2025')
+        assert response.status_code == 200
+        workbook = load_workbook(io.BytesIO(response.data))
+        assert workbook.sheetnames[:2] == ['Summary', 'April 2025']
+        assert workbook.sheetnames[-1] == 'March 2026'
+        assert len(workbook.sheetnames) == 13
+        totals = [row for row in workbook['Summary'].iter_rows(values_only=True) if row[0] == 'Total']
+        assert totals == [('Total', 3, 2850.5, 950.17)]
+
+
+def test_xlsx_never_writes_formulas():
+    """Reasons that look like formulas are stored as plain text"""
+    reasons = ['=HYPERLINK("http://example.com","Refund")', '+91 courier', '-stamp', '@SUM(A1)']
+    expenses = [
+        {'date': '2026-03-01', 'amount': 1.0, 'reason': reason, 'timestamp': '2026-03-01T10:00:00'}
+        for reason in reasons
+    ]
+    workbook = load_workbook(io.BytesIO(render_xlsx([build_month_section(2026, 3, expenses)], 'Report')))
+    cells = [row[2] for row in workbook['March 2026'].iter_rows(min_row=4, max_row=3 + len(reasons))]
+    assert [cell.value for cell in cells] == reasons
+    assert {cell.data_type for cell in cells} == {'s'}
+
+
+if __name__ == "__main__":
+    print("Testing Legal Success India Expense Tracker backend modules...")
+    print("=" * 50)
+
+    tests = [(name, func) for name, func in list(globals().items()) if name.startswith('test_') and callable(func)]
+
+    passed = 0
+    total = len(tests)
+
+    for test_name, test_func in tests:
+        print(f"\n🧪 Running {test_name}...")
+        try:
+            test_func()
+            print(f"✅ {test_name} PASSED")
+            passed += 1
+        except Exception as e:
+            print(f"❌ {test_name} FAILED: {e!r}")
+
+    print(f"\n{'='*50}")
+    print(f"Results: {passed}/{total} tests passed")
+    sys.exit(0 if passed == total else 1)